@@ -23,10 +23,26 @@ myobj = paywhirl.get_customers(list_size_limit)
 print(myobj)
 ```
 
+Traffic Capture and Replay:
+---------------------------
+Passing capture_path to PayWhirl appends one tab-separated line per
+request: start time, method, endpoint, status, request and response
+sizes in bytes and latency in ms. A capture can be replayed at a
+multiple of its original rate against a local stand-in server
+with the paywhirl_replay.py script:
+```
+python paywhirl_replay.py replay traffic.log --speed 5 --clients 64
+```
+
 For information on type hints in Python 3.5 and higher see
 https://www.python.org/dev/peps/pep-0484/
 """
-from typing import Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterable, Optional
+from urllib.parse import urlparse
+import os
+import threading
+import time
 import requests
 
 
@@ -34,12 +50,14 @@ class PayWhirl:
     _api_key = ''
     _api_secret = ''
     _api_base = ''
+    _capture_file = None
 
     def __init__(
             self,
             api_key: str,
             api_secret: str,
-            api_base: str = 'https://api.paywhirl.com') -> None:
+            api_base: str = 'https://api.paywhirl.com',
+            capture_path: Optional[str] = None) -> None:
         """Initialize the paywhirl object for making requests.
 
         Args:
@@ -47,11 +65,17 @@ class PayWhirl:
             api_secret: your secret key
             api_base: the target URL for requests.
                 Defaults to 'https://api.paywhirl.com'
+            capture_path: if given, metadata for every request is
+                appended to this file for later replay.
+                Defaults to no capture.
         """
 
         self._api_key = api_key
         self._api_secret = api_secret
         self._api_base = api_base
+        if capture_path is not None:
+            self._capture_file = open(capture_path, 'a')
+            self._capture_lock = threading.Lock()
 
     def get_customers(self, data: dict) -> list:
         """Get a list of customers associated with your account.
@@ -651,13 +675,30 @@ class PayWhirl:
         """
         return self._post('/multiauth', data)
 
+    def close(self) -> None:
+        """Close the capture file, if one was opened."""
+
+        if self._capture_file is None:
+            return
+        with self._capture_lock:
+            self._capture_file.close()
+            self._capture_file = None
+
+    def __enter__(self) -> 'PayWhirl':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
     def _post(self, endpoint: str, params: Any = None) -> Any:
         if params is None:
             params = {}
         url = (self._api_base + '/' + endpoint)
         headers = {'api_key': self._api_key, 'api_secret': self._api_secret}
         print(url, headers)
+        start = time.perf_counter()
         resp = requests.post(url, headers=headers, params=params)
+        self._capture('POST', endpoint, resp, start)
         if resp.status_code == requests.codes['ok']:
             ret = resp.json()
             resp.close()
@@ -671,10 +712,196 @@ class PayWhirl:
         url = self._api_base + '/' + endpoint
         headers = {'api_key': self._api_key, 'api_secret': self._api_secret}
         print(url, headers)
+        start = time.perf_counter()
         resp = requests.get(url, headers=headers, params=params)
+        self._capture('GET', endpoint, resp, start)
         if resp.status_code == requests.codes['ok']:
             ret = resp.json()
             resp.close()
             return ret
 
         return resp.status_code
+
+    def _capture(
+            self,
+            method: str,
+            endpoint: str,
+            resp: Any,
+            start: float) -> None:
+        if self._capture_file is None:
+            return
+        elapsed = time.perf_counter() - start
+        # Capture is diagnostic only, so nothing in it may replace the
+        # result of a request that already went through.
+        try:
+            line = '\t'.join([
+                '%.3f' % (time.time() - elapsed),
+                method,
+                endpoint,
+                str(resp.status_code),
+                str(len(urlparse(resp.request.url).query)),
+                str(len(resp.content)),
+                '%.1f' % (elapsed * 1000)])
+            with self._capture_lock:
+                if self._capture_file is not None:
+                    self._capture_file.write(line + '\n')
+                    self._capture_file.flush()
+        except Exception:
+            pass
+
+
+class _RateLimiter:
+    """Hand out evenly spaced send slots to any number of threads."""
+
+    def __init__(self, rate: float) -> None:
+        self._interval = 1.0 / rate
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self._interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class EmailDispatcher:
+    """Send one email template to many customers concurrently.
+
+    Outcomes are appended to a journal file as they complete, so a run
+    that is interrupted can be started again with the same journal and
+    will skip every customer that was already sent the email. Journal
+    entries record the template ID, so only earlier sends of the same
+    template are skipped.
+
+    Example Usage:
+    --------------
+    ```
+    dispatcher = pw.EmailDispatcher(paywhirl, 12, 'campaign.journal',
+                                    rate=20, workers=8)
+    recipients = ({'customer_id': cid} for cid in customer_ids)
+    print(dispatcher.dispatch(recipients))
+    ```
+    """
+
+    def __init__(
+            self,
+            paywhirl: PayWhirl,
+            template_id: int,
+            journal_path: str,
+            rate: float = 10.0,
+            workers: int = 8) -> None:
+        """Initialize the dispatcher.
+
+        Args:
+            paywhirl: the PayWhirl object used to send the emails
+            template_id: the email template to send to every recipient
+            journal_path: file recording per-recipient outcomes.
+                It is created if missing and appended to otherwise.
+            rate: the maximum number of sends per second.
+                Defaults to 10.
+            workers: the number of sends allowed in flight at once.
+                Defaults to 8.
+
+        Raises:
+            ValueError: if rate is not positive or workers is below 1.
+        """
+
+        if rate <= 0:
+            raise ValueError('rate must be greater than 0')
+        if workers < 1:
+            raise ValueError('workers must be at least 1')
+        self._paywhirl = paywhirl
+        self._template_id = template_id
+        self._journal_path = journal_path
+        self._rate = rate
+        self._workers = workers
+
+    def dispatch(self, recipients: Iterable[dict]) -> Any:
+        """Send the template to every recipient not already sent to.
+
+        Args:
+            recipients: an iterable of send_email() data dicts.
+                Each one needs a 'customer_id' key, 'template_id'
+                is filled in by the dispatcher. The iterable is
+                consumed lazily, so a generator works for large sends.
+
+        Returns:
+            A dictionary with the 'sent', 'failed' and 'skipped'
+            counts, 'elapsed' seconds and sustained 'sends_per_second',
+            or the error code from get_email_template() if the
+            template could not be found.
+        """
+
+        template = self._paywhirl.get_email_template(self._template_id)
+        if isinstance(template, int):
+            return template
+
+        template_key = str(self._template_id)
+        done = self._read_journal(template_key)
+        counts = {'sent': 0, 'failed': 0, 'skipped': 0}
+        limiter = _RateLimiter(self._rate)
+        lock = threading.Lock()
+        # Bound the backlog so a huge recipient stream is not
+        # read into memory ahead of the sends.
+        slots = threading.BoundedSemaphore(self._workers * 2)
+        start = time.perf_counter()
+
+        with open(self._journal_path, 'a') as journal:
+
+            def send(recipient: dict) -> bool:
+                limiter.wait()
+                data = dict(recipient, template_id=self._template_id)
+                try:
+                    resp = self._paywhirl.send_email(data)
+                except Exception:
+                    # Any failed send is journaled, never left to
+                    # escape into record() and strand its slot.
+                    return False
+                return isinstance(resp, dict) and \
+                    resp.get('status') == 'success'
+
+            def record(customer_id: str, future: Any) -> None:
+                try:
+                    sent = not future.exception() and future.result()
+                    outcome = 'sent' if sent else 'failed'
+                    with lock:
+                        counts[outcome] += 1
+                        journal.write('\t'.join(
+                            [template_key, customer_id, outcome]) + '\n')
+                        journal.flush()
+                finally:
+                    slots.release()
+
+            with ThreadPoolExecutor(self._workers) as pool:
+                for recipient in recipients:
+                    customer_id = str(recipient['customer_id'])
+                    if customer_id in done:
+                        counts['skipped'] += 1
+                        continue
+                    done.add(customer_id)
+                    slots.acquire()
+                    future = pool.submit(send, recipient)
+                    future.add_done_callback(
+                        lambda f, cid=customer_id: record(cid, f))
+
+        elapsed = time.perf_counter() - start
+        counts['elapsed'] = elapsed
+        counts['sends_per_second'] = \
+            counts['sent'] / elapsed if elapsed > 0 else 0.0
+        return counts
+
+    def _read_journal(self, template_key: str) -> set:
+        # Only sends of this template count, so a journal reused for
+        # another campaign does not skip its recipients.
+        done = set()
+        if not os.path.exists(self._journal_path):
+            return done
+        with open(self._journal_path) as journal:
+            for line in journal:
+                fields = line.rstrip('\n').split('\t')
+                if fields[0] == template_key and fields[2:] == ['sent']:
+                    done.add(fields[1])
+        return done
@@ -0,0 +1,310 @@
+"""PayWhirl Traffic Replay
+========================
+
+Replay traffic captured with PayWhirl(capture_path=...) against a
+local stand-in server, to size workers against a realistic mix of
+API calls. This script is not needed for normal use of paywhirl.py.
+
+
+Example Usage:
+--------------
+```
+python paywhirl_replay.py replay traffic.log --speed 5 --clients 64
+```
+
+This starts a stand-in server in a separate process, replays the
+capture at 5 times its original rate over 64 concurrent clients and
+prints latency percentiles and client CPU time per request. Use
+`serve` to run the stand-in on its own, or `--api-base` to replay
+against another server.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from typing import Any, Optional
+from urllib.parse import parse_qs, urlencode
+import argparse
+import contextlib
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from paywhirl import PayWhirl
+
+
+def read_capture(capture_path: str) -> list:
+    """Load a capture written by PayWhirl(capture_path=...).
+
+    Args:
+        capture_path: the capture file to read.
+
+    Returns:
+        A list of request dicts sorted by start time, each with the
+        keys 'time', 'method', 'endpoint', 'status', 'request_bytes',
+        'response_bytes' and 'elapsed_ms'.
+    """
+
+    records = []
+    with open(capture_path) as capture:
+        for line in capture:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) != 7:
+                continue
+            records.append({
+                'time': float(fields[0]),
+                'method': fields[1],
+                'endpoint': fields[2],
+                'status': int(fields[3]),
+                'request_bytes': int(fields[4]),
+                'response_bytes': int(fields[5]),
+                'elapsed_ms': float(fields[6])})
+    records.sort(key=lambda record: record['time'])
+    return records
+
+
+class _StandInServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def _stand_in_handler(records: list) -> Any:
+    # Requests sent by replay_capture() name the record they replay.
+    # Anything else gets the last response seen for its endpoint.
+    responses = {}
+    for record in records:
+        responses[record['endpoint'].lstrip('/')] = \
+            (record['status'], record['response_bytes'])
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _respond(self) -> None:
+            path, _, query = self.path.partition('?')
+            index = parse_qs(query).get('replay_record', [''])[0]
+            if index.isdigit() and int(index) < len(records):
+                record = records[int(index)]
+                status, size = record['status'], record['response_bytes']
+            else:
+                status, size = responses.get(path.lstrip('/'), (404, 0))
+            body = b'{"pad":"' + b'x' * max(size - 10, 0) + b'"}'
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = _respond
+        do_POST = _respond
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+    return Handler
+
+
+def _stand_in_server(records: list, port: int) -> _StandInServer:
+    return _StandInServer(('127.0.0.1', port), _stand_in_handler(records))
+
+
+def serve_capture(records: list, port: int = 8000) -> None:
+    """Serve the captured endpoints locally until interrupted.
+
+    Each replayed request is answered with its captured status and a
+    JSON body of its captured response size, so replayed clients do the
+    same parsing work as against the real API.
+
+    Args:
+        records: requests loaded with read_capture().
+        port: the local port to listen on. Defaults to 8000.
+    """
+
+    server = _stand_in_server(records, port)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def _percentile(ordered: list, fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(fraction * len(ordered)))
+    return ordered[index]
+
+
+def replay_capture(
+        records: list,
+        api_base: str,
+        speed: float = 1.0,
+        clients: int = 16) -> dict:
+    """Replay captured requests against api_base at a multiple of
+       their original rate.
+
+    Args:
+        records: requests loaded with read_capture().
+        api_base: the server to send requests to, normally a stand-in
+            started with serve_capture().
+        speed: how many times faster than captured to send requests.
+            Defaults to 1.
+        clients: the number of requests allowed in flight at once.
+            Defaults to 16.
+
+    Returns:
+        A dictionary with the request and error counts, the achieved
+        'requests_per_second', latency percentiles in ms measured from
+        each request's scheduled send time, and 'cpu_ms_per_request',
+        the client process CPU time spent per request.
+
+    Raises:
+        ValueError: if speed is not positive or clients is below 1.
+    """
+
+    if speed <= 0:
+        raise ValueError('speed must be greater than 0')
+    if clients < 1:
+        raise ValueError('clients must be at least 1')
+    paywhirl = PayWhirl('replay', 'replay', api_base)
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def send(index: int, record: dict, due: float) -> None:
+        params = {'replay_record': index}
+        size = record['request_bytes'] - len(urlencode(params)) - 5
+        params['pad'] = 'x' * max(size, 0)
+        try:
+            if record['method'] == 'POST':
+                resp = paywhirl._post(record['endpoint'], params)
+            else:
+                resp = paywhirl._get(record['endpoint'], params)
+            failed = isinstance(resp, int) and resp != record['status']
+        except Exception:
+            # Count anything that goes wrong, rather than letting it
+            # vanish with the discarded future and skew the report.
+            failed = True
+        latency = (time.perf_counter() - due) * 1000
+        with lock:
+            latencies.append(latency)
+            if failed:
+                errors[0] += 1
+
+    first = records[0]['time'] if records else 0.0
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        for index, record in enumerate(records):
+            due = start + (record['time'] - first) / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, index, record, due)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    latencies.sort()
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors[0],
+        'elapsed': elapsed,
+        'requests_per_second': count / elapsed if elapsed > 0 else 0.0,
+        'p50_ms': _percentile(latencies, 0.50),
+        'p90_ms': _percentile(latencies, 0.90),
+        'p99_ms': _percentile(latencies, 0.99),
+        'max_ms': latencies[-1] if latencies else 0.0,
+        'cpu_ms_per_request': cpu * 1000 / count if count else 0.0}
+
+
+def _free_port() -> int:
+    with contextlib.closing(socket.socket()) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(
+        port: int,
+        server: subprocess.Popen,
+        timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', port), 1).close()
+            return
+        except OSError:
+            code = server.poll()
+            if code is not None:
+                raise OSError(str.format(
+                    'stand-in server exited with code {0}', code))
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def _positive(convert: Any) -> Any:
+    def parse(value: str) -> Any:
+        number = convert(value)
+        if number <= 0:
+            raise argparse.ArgumentTypeError(
+                str.format('must be greater than 0, got {0}', value))
+        return number
+    return parse
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description='Serve or replay a captured PayWhirl traffic log.')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    serve = commands.add_parser(
+        'serve', help='run a local stand-in server for a capture')
+    serve.add_argument('capture')
+    serve.add_argument('--port', type=int, default=8000)
+
+    replay = commands.add_parser(
+        'replay', help='replay a capture and report latency and CPU cost')
+    replay.add_argument('capture')
+    replay.add_argument('--speed', type=_positive(float), default=1.0,
+                        help='multiple of the captured request rate')
+    replay.add_argument('--clients', type=_positive(int), default=16,
+                        help='number of concurrent clients')
+    replay.add_argument('--api-base',
+                        help='server to replay against. Defaults to a '
+                             'stand-in started in a separate process')
+
+    args = parser.parse_args(argv)
+    records = read_capture(args.capture)
+    if args.command == 'serve':
+        serve_capture(records, args.port)
+        return
+
+    server = None
+    api_base = args.api_base
+    if api_base is None:
+        # The stand-in runs in its own process so that its work is
+        # not counted in the client CPU cost.
+        port = _free_port()
+        server = subprocess.Popen([
+            sys.executable, os.path.abspath(__file__), 'serve',
+            args.capture, '--port', str(port)])
+        api_base = 'http://127.0.0.1:' + str(port)
+    try:
+        if server is not None:
+            _wait_for_port(port, server)
+        # The request methods print every call, so keep that off the
+        # terminal while still paying its cost like a real client would.
+        with open(os.devnull, 'w') as devnull, \
+                contextlib.redirect_stdout(devnull):
+            report = replay_capture(
+                records, api_base, args.speed, args.clients)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    for key, value in report.items():
+        print(str.format('{0}: {1:.6g}', key, value))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import pytest
+
+import paywhirl as pw
+import paywhirl_replay
+
+
+class FakeRequest:
+    def __init__(self, url):
+        self.url = url
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, content=b'{"id":1}',
+                 url='https://api.paywhirl.com//account'):
+        self.status_code = status_code
+        self.content = content
+        self.request = FakeRequest(url)
+
+    def json(self):
+        return {'id': 1}
+
+    def close(self):
+        pass
+
+
+class BrokenFile:
+    def write(self, data):
+        raise OSError('disk full')
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_requests(monkeypatch):
+    sent = []
+
+    def fake_request(url, headers, params):
+        sent.append(params)
+        return FakeResponse(url=url + '?amount=10')
+
+    monkeypatch.setattr(pw.requests, 'get', fake_request)
+    monkeypatch.setattr(pw.requests, 'post', fake_request)
+    return sent
+
+
+def test_capture_line_round_trips_through_read_capture(tmp_path):
+    path = str(tmp_path / 'capture.log')
+    with pw.PayWhirl('k', 's', capture_path=path) as paywhirl:
+        paywhirl._capture(
+            'POST', '/create/charge',
+            FakeResponse(201, url='https://x//create/charge?amount=10'), 0.0)
+    with open(path) as capture:
+        fields = capture.read().rstrip('\n').split('\t')
+    assert fields[1:6] == ['POST', '/create/charge', '201', '9', '8']
+
+    [loaded] = paywhirl_replay.read_capture(path)
+    assert loaded['method'] == 'POST'
+    assert loaded['endpoint'] == '/create/charge'
+    assert (loaded['status'], loaded['request_bytes'],
+            loaded['response_bytes']) == (201, 9, 8)
+
+
+def test_requests_are_captured(tmp_path, fake_requests):
+    path = str(tmp_path / 'capture.log')
+    with pw.PayWhirl('k', 's', capture_path=path) as paywhirl:
+        assert paywhirl.get_customer(1) == {'id': 1}
+        assert paywhirl.create_charge({'amount': 10}) == {'id': 1}
+    records = paywhirl_replay.read_capture(path)
+    assert [r['method'] for r in records] == ['GET', 'POST']
+    assert [r['request_bytes'] for r in records] == [9, 9]
+
+
+def test_capture_failure_does_not_replace_result(tmp_path, fake_requests):
+    with pw.PayWhirl('k', 's',
+                     capture_path=str(tmp_path / 'c.log')) as paywhirl:
+        paywhirl._capture_file.close()
+        paywhirl._capture_file = BrokenFile()
+        assert paywhirl.create_charge({'amount': 10}) == {'id': 1}
+        # Params that are not a mapping must not break capture either.
+        assert paywhirl._get('/x', 'a=b') == {'id': 1}
+        paywhirl._capture('GET', '/x', object(), 0.0)
+
+    paywhirl = pw.PayWhirl('k', 's', capture_path=str(tmp_path / 'c.log'))
+    paywhirl.close()
+    assert paywhirl.get_account() == {'id': 1}
@@ -0,0 +1,115 @@
+import threading
+import time
+
+import pytest
+
+import paywhirl as pw
+
+
+class FakePayWhirl:
+    def __init__(self, template=None, fail=(), raise_on=(), barrier=None):
+        self.template = {'id': 3} if template is None else template
+        self.fail = set(fail)
+        self.raise_on = set(raise_on)
+        self.barrier = barrier
+        self.sent_to = []
+        self._lock = threading.Lock()
+
+    def get_email_template(self, template_id):
+        return self.template
+
+    def send_email(self, data):
+        customer_id = data['customer_id']
+        with self._lock:
+            self.sent_to.append(customer_id)
+        if self.barrier is not None:
+            self.barrier.wait()
+        if customer_id in self.raise_on:
+            raise ValueError('boom')
+        if customer_id in self.fail:
+            return 500
+        return {'status': 'success'}
+
+
+def recipients(count):
+    return ({'customer_id': i} for i in range(count))
+
+
+def read_journal(path):
+    with open(path) as journal:
+        return [line.rstrip('\n').split('\t') for line in journal]
+
+
+def test_resume_skips_sent_and_retries_failed(tmp_path):
+    journal = str(tmp_path / 'journal')
+    first = FakePayWhirl(fail={1, 4})
+    result = pw.EmailDispatcher(first, 3, journal, rate=1000).dispatch(
+        recipients(6))
+    assert (result['sent'], result['failed'], result['skipped']) == (4, 2, 0)
+
+    second = FakePayWhirl()
+    result = pw.EmailDispatcher(second, 3, journal, rate=1000).dispatch(
+        recipients(6))
+    assert (result['sent'], result['failed'], result['skipped']) == (2, 0, 4)
+    assert sorted(second.sent_to) == [1, 4]
+
+
+def test_journal_reused_for_another_template_sends_again(tmp_path):
+    journal = str(tmp_path / 'journal')
+    pw.EmailDispatcher(FakePayWhirl(), 3, journal, rate=1000).dispatch(
+        recipients(4))
+
+    fake = FakePayWhirl()
+    result = pw.EmailDispatcher(fake, 7, journal, rate=1000).dispatch(
+        recipients(4))
+    assert (result['sent'], result['skipped']) == (4, 0)
+    assert sorted(fake.sent_to) == [0, 1, 2, 3]
+
+    result = pw.EmailDispatcher(FakePayWhirl(), 3, journal,
+                                rate=1000).dispatch(recipients(4))
+    assert (result['sent'], result['skipped']) == (0, 4)
+
+
+def test_sends_stay_within_rate(tmp_path):
+    start = time.perf_counter()
+    result = pw.EmailDispatcher(FakePayWhirl(), 3, str(tmp_path / 'j'),
+                                rate=20, workers=4).dispatch(recipients(10))
+    elapsed = time.perf_counter() - start
+    assert result['sent'] == 10
+    # The first send goes at once, then one every 1/20th of a second.
+    assert elapsed >= 0.45 - 0.02
+    assert result['sends_per_second'] <= 20 * 1.1 + 1
+
+
+def test_workers_send_concurrently(tmp_path):
+    # Every send blocks until four are in flight at once.
+    fake = FakePayWhirl(barrier=threading.Barrier(4, timeout=5))
+    result = pw.EmailDispatcher(fake, 3, str(tmp_path / 'j'), rate=1000,
+                                workers=4).dispatch(recipients(8))
+    assert (result['sent'], result['failed']) == (8, 0)
+
+
+def test_template_error_returns_code_without_sending(tmp_path):
+    fake = FakePayWhirl(template=404)
+    journal = tmp_path / 'journal'
+    result = pw.EmailDispatcher(fake, 3, str(journal)).dispatch(recipients(3))
+    assert result == 404
+    assert fake.sent_to == []
+    assert not journal.exists()
+
+
+def test_raising_send_is_journaled_as_failed(tmp_path):
+    journal = str(tmp_path / 'journal')
+    fake = FakePayWhirl(raise_on={i for i in range(30) if i % 3 == 0})
+    result = pw.EmailDispatcher(fake, 3, journal, rate=1000,
+                                workers=2).dispatch(recipients(30))
+    assert (result['sent'], result['failed']) == (20, 10)
+    outcomes = {cid: outcome for _, cid, outcome in read_journal(journal)}
+    assert outcomes['0'] == 'failed'
+    assert outcomes['1'] == 'sent'
+
+
+@pytest.mark.parametrize('kwargs', [{'rate': 0}, {'workers': 0}])
+def test_invalid_arguments(tmp_path, kwargs):
+    with pytest.raises(ValueError):
+        pw.EmailDispatcher(FakePayWhirl(), 3, str(tmp_path / 'j'), **kwargs)
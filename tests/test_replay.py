@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+
+import paywhirl as pw
+import paywhirl_replay as replay
+
+
+def record(time, endpoint, status=200, response_bytes=100, method='GET'):
+    return {'time': time, 'method': method, 'endpoint': endpoint,
+            'status': status, 'request_bytes': 20,
+            'response_bytes': response_bytes, 'elapsed_ms': 1.0}
+
+
+@pytest.fixture
+def stand_in():
+    servers = []
+
+    def start(records):
+        server = replay._stand_in_server(records, 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return 'http://127.0.0.1:' + str(server.server_address[1])
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_read_capture_sorts_and_skips_malformed_lines(tmp_path):
+    path = tmp_path / 'capture.log'
+    path.write_text('2.0\tGET\t/b\t200\t0\t5\t1.0\n'
+                    'garbage\n'
+                    '1.0\tGET\t/a\t200\t0\t5\t1.0\n')
+    records = replay.read_capture(str(path))
+    assert [r['endpoint'] for r in records] == ['/a', '/b']
+
+
+def test_capture_and_replay_round_trip(tmp_path, stand_in):
+    api_base = stand_in([record(0.0, '/customer/1', response_bytes=800),
+                         record(0.0, '/create/charge', method='POST')])
+    path = str(tmp_path / 'capture.log')
+    with pw.PayWhirl('k', 's', api_base, capture_path=path) as paywhirl:
+        for _ in range(10):
+            assert isinstance(paywhirl.get_customer(1), dict)
+            assert isinstance(paywhirl.create_charge({'amount': 5}), dict)
+
+    records = replay.read_capture(path)
+    assert len(records) == 20
+    report = replay.replay_capture(records, stand_in(records), speed=10,
+                                   clients=4)
+    assert report['requests'] == 20
+    assert report['errors'] == 0
+    assert 0 < report['p50_ms'] <= report['p90_ms'] <= report['p99_ms'] \
+        <= report['max_ms']
+    assert report['cpu_ms_per_request'] > 0
+    assert report['requests_per_second'] > 0
+
+
+def test_replay_answers_each_record_with_its_own_response(stand_in):
+    records = [record(i * 0.001, '/customers', status=500 if i % 2 else 200,
+                      response_bytes=100 + i) for i in range(10)]
+    api_base = stand_in(records)
+    report = replay.replay_capture(records, api_base, clients=2)
+    assert report['requests'] == 10
+    assert report['errors'] == 0
+
+    paywhirl = pw.PayWhirl('k', 's', api_base)
+    for index in (0, 4):
+        resp = paywhirl._get('/customers', {'replay_record': index})
+        assert len(resp['pad']) + 10 == 100 + index
+
+
+def test_replay_counts_unexpected_exceptions(monkeypatch):
+    def broken(self, endpoint, params=None):
+        raise ValueError('not json')
+
+    monkeypatch.setattr(pw.PayWhirl, '_get', broken)
+    records = [record(0.0, '/customers') for _ in range(5)]
+    report = replay.replay_capture(records, 'http://127.0.0.1:1')
+    assert (report['requests'], report['errors']) == (5, 5)
+
+
+def test_replay_leaves_stdout_alone(capsys, stand_in):
+    records = [record(0.0, '/account')]
+    replay.replay_capture(records, stand_in(records))
+    assert '//account' in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('option', [['--speed', '0'], ['--clients', '0']])
+def test_replay_rejects_non_positive_options(option):
+    with pytest.raises(SystemExit):
+        replay.main(['replay', 'capture.log'] + option)